@@ -1,6 +1,8 @@
 import json
+import re
 import uuid
-from datetime import datetime
+import orjson
+import time
 from typing import Any
 from langchain_core.pydantic_v1 import BaseModel, Field, ValidationError
 from langchain_openai import ChatOpenAI
@@ -8,11 +10,12 @@ import os
 import logging
 import asyncio
 from langchain_core.messages import AIMessage
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.pydantic_v1 import BaseModel, Field, parse_obj_as
 
 logging.basicConfig(level=logging.INFO, encoding='utf-8')
 
+# Fallback description used when the caller sends an empty request.
+_PROJECT_PREFIX = "Generic E-commerce Project "
+
 # --- LLM for generating domain-specific content ---
 llm = ChatOpenAI(
     api_key=os.getenv('OPENAI_API_KEY'),
@@ -110,6 +113,9 @@ def _normalize_generated_payload(payload: Any) -> Any:
     return payload
 
 
+# Optional ```json fence around the model's reply (closing fence optional for truncated replies); group 1 is the JSON inside
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*(.*?)\s*(?:```)?\s*$', re.DOTALL)
+
 # --- Prompt for LLM ---
 async def _generate_eventstorming_concepts(description: str) -> EventstormingConcepts | None:
     """Uses an LLM to generate domain-specific concepts from a user description."""
@@ -227,7 +233,8 @@ async def _generate_eventstorming_concepts(description: str) -> EventstormingCon
             else:
                 response_content = str(response)
             
-            clean_json_str = response_content.strip().removeprefix("```json").removesuffix("```")
+            match = _FENCE_RE.match(response_content)
+            clean_json_str = match.group(1) if match else response_content.strip()
             
             # Manually parse the JSON, normalize missing collections, and validate with Pydantic
             data = json.loads(clean_json_str)
@@ -246,6 +253,18 @@ async def _generate_eventstorming_concepts(description: str) -> EventstormingCon
     return None
 
 
+_ID_POOL_SIZE = 256
+_id_pool: list[str] = []
+
+
+def _new_id() -> str:
+    """Returns a UUID4 string, refilling the pool with a single os.urandom call when empty."""
+    if not _id_pool:
+        buf = os.urandom(16 * _ID_POOL_SIZE)
+        _id_pool.extend(str(uuid.UUID(bytes=buf[i:i + 16], version=4)) for i in range(0, len(buf), 16))
+    return _id_pool.pop()
+
+
 def _slugify(text: str) -> str:
     return ''.join(c if c.isalnum() else '-' for c in text).strip('-').lower() or 'eventstorming-board'
 
@@ -266,7 +285,7 @@ MAX_ITEM_HEIGHT = 260
 
 
 def compute_item_dimensions(item_type: str, data: dict) -> tuple[int, int]:
-    base = BASE_ITEM_DIMENSIONS.get(item_type, BASE_ITEM_DIMENSIONS["default"]).copy()
+    base = BASE_ITEM_DIMENSIONS.get(item_type, BASE_ITEM_DIMENSIONS["default"])
     width = base["width"]
     height = base["height"]
 
@@ -294,7 +313,7 @@ def _create_eventstorming_board(description: str, concepts: EventstormingConcept
     api_base = "http://localhost:3000/api"
     
     # 1. Create or Identify Board
-    board_id = str(uuid.uuid4())
+    board_id = _new_id()
     board_name = _slugify(concepts.project_name)
     
     # Check if we can use an existing board ID from existing_board
@@ -324,7 +343,7 @@ def _create_eventstorming_board(description: str, concepts: EventstormingConcept
 
     # 3. Process Contexts and Create Items
     for context in concepts.contexts:
-        logging.info(f"Processing context: {context.name}")
+        logging.info("Processing context: %s", context.name)
         
         # Process each type of element
         elements = []
@@ -351,7 +370,7 @@ def _create_eventstorming_board(description: str, concepts: EventstormingConcept
                     domain_obj = domain_resp.json()
                     domain_id = domain_obj['id']
                 except Exception as e:
-                    logging.error(f"Failed to create domain object {item.name}: {e}")
+                    logging.error("Failed to create domain object %s: %s", item.name, e)
                     continue
 
                 # B. Create CanvasItem
@@ -379,7 +398,7 @@ def _create_eventstorming_board(description: str, concepts: EventstormingConcept
                         "domainObjectId": domain_id
                     })
                 except Exception as e:
-                    logging.error(f"Failed to create canvas item for {item.name}: {e}")
+                    logging.error("Failed to create canvas item for %s: %s", item.name, e)
 
                 # Update position
                 current_x += x_gap
@@ -388,7 +407,7 @@ def _create_eventstorming_board(description: str, concepts: EventstormingConcept
                     current_y += y_gap
                     
             except Exception as e:
-                logging.error(f"Error processing item {item.name}: {e}")
+                logging.error("Error processing item %s: %s", item.name, e)
 
         # New row for next context
         current_x = x_pos
@@ -478,6 +497,7 @@ def _adjust_board_layout(items: list[dict]) -> list[dict]:
         if not children:
             continue
             
+        # Work on local copies of the context geometry and write them back once
         ctx_x = context["x"]
         ctx_y = context["y"]
         ctx_w = context["width"]
@@ -491,10 +511,8 @@ def _adjust_board_layout(items: list[dict]) -> list[dict]:
         for child in children:
             ch_x = child["x"]
             ch_y = child["y"]
-            ch_w = child["width"]
-            ch_h = child["height"]
-            ch_right = ch_x + ch_w
-            ch_bottom = ch_y + ch_h
+            ch_right = ch_x + child["width"]
+            ch_bottom = ch_y + child["height"]
             
             # Check if completely outside (detached)
             is_outside_x = ch_right < ctx_x or ch_x > ctx_right
@@ -502,26 +520,32 @@ def _adjust_board_layout(items: list[dict]) -> list[dict]:
             
             if is_outside_x or is_outside_y:
                 detached_children.append(child)
-            else:
-                # Partially inside, ensure context grows to fit
-                if ch_x < ctx_x:
-                    diff = ctx_x - ch_x
-                    context["x"] -= diff
-                    context["width"] += diff
-                    ctx_x = context["x"]
-                if ch_y < ctx_y:
-                    diff = ctx_y - ch_y
-                    context["y"] -= diff
-                    context["height"] += diff
-                    ctx_y = context["y"]
-                if ch_right > ctx_x + context["width"]:
-                    context["width"] = ch_right - ctx_x + PADDING
-                if ch_bottom > ctx_y + context["height"]:
-                    context["height"] = ch_bottom - ctx_y + PADDING
+                continue
+
+            # Fully inside (the common case): nothing to grow
+            if ch_x >= ctx_x and ch_y >= ctx_y and ch_right <= ctx_x + ctx_w and ch_bottom <= ctx_y + ctx_h:
+                continue
+
+            # Partially inside, ensure context grows to fit
+            if ch_x < ctx_x:
+                ctx_w += ctx_x - ch_x
+                ctx_x = ch_x
+            if ch_y < ctx_y:
+                ctx_h += ctx_y - ch_y
+                ctx_y = ch_y
+            if ch_right > ctx_x + ctx_w:
+                ctx_w = ch_right - ctx_x + PADDING
+            if ch_bottom > ctx_y + ctx_h:
+                ctx_h = ch_bottom - ctx_y + PADDING
+
+        context["x"] = ctx_x
+        context["y"] = ctx_y
+        context["width"] = ctx_w
+        context["height"] = ctx_h
                     
         # Fix detached children by stacking them inside the context
         if detached_children:
-            logging.warning(f"Context '{context['instanceName']}' has {len(detached_children)} detached children. Snapping them back.")
+            logging.warning("Context '%s' has %d detached children. Snapping them back.", context['instanceName'], len(detached_children))
             
             # Sort by type to keep some order (Command -> Aggregate -> Event/ReadModel)
             type_order = {"Command": 0, "Policy": 1, "Aggregate": 2, "Event": 3, "ReadModel": 4}
@@ -549,7 +573,7 @@ class EventstormingAgent:
 
     async def ainvoke(self, description: str, existing_board: dict | None = None) -> str:
         if not description:
-            description = f"Generic E-commerce Project {datetime.utcnow().isoformat()}"
+            description = f"{_PROJECT_PREFIX}{time.time_ns()}"
 
         # Use LLM to get domain-specific concepts
         concepts = await _generate_eventstorming_concepts(description)
@@ -560,7 +584,7 @@ class EventstormingAgent:
                 "boardType": "Eventstorming",
                 "instanceName": "error-board",
                 "items": [{
-                    "id": str(uuid.uuid4()),
+                    "id": _new_id(),
                     "type": "Error",
                     "instanceName": "Failed to generate concepts",
                     "description": "The language model failed to produce a valid set of domain concepts after multiple retries."
@@ -571,6 +595,7 @@ class EventstormingAgent:
             # Build the board from these concepts
             board = _create_eventstorming_board(description, concepts, existing_board)
 
-        return json.dumps(board, ensure_ascii=False)
+        # orjson emits UTF-8 directly, matching the previous ensure_ascii=False output.
+        return orjson.dumps(board).decode('utf-8')
 
     SUPPORTED_CONTENT_TYPES = ['text', 'text/plain']
\ No newline at end of file
@@ -32,11 +32,21 @@ AGENT_REGISTRY = {
     "uml_agent": "http://localhost:10005",
 }
 
+# Card resolvers keyed by base_url, together with the client they were built for.
+_RESOLVERS: dict[str, tuple[httpx.AsyncClient, A2ACardResolver]] = {}
+
+def _get_resolver(base_url: str, httpx_client: httpx.AsyncClient) -> A2ACardResolver:
+    cached = _RESOLVERS.get(base_url)
+    if cached is None or cached[0] is not httpx_client:
+        cached = (httpx_client, A2ACardResolver(httpx_client=httpx_client, base_url=base_url))
+        _RESOLVERS[base_url] = cached
+    return cached[1]
+
 async def discover_agent_by_skill(skill_id: str, httpx_client: httpx.AsyncClient) -> A2AClient | None:
     logger.info(f"Discovering agent with skill: {skill_id}...")
     for name, base_url in AGENT_REGISTRY.items():
         try:
-            resolver = A2ACardResolver(httpx_client=httpx_client, base_url=base_url)
+            resolver = _get_resolver(base_url, httpx_client)
             agent_card = await resolver.get_agent_card()
             if any(skill.id == skill_id for skill in agent_card.skills):
                 logger.info(f"Found agent '{name}' at {base_url} with the required skill.")
@@ -1,4 +1,5 @@
 import logging
+import contextlib
 import click
 import httpx
 import uvicorn
@@ -17,6 +18,7 @@ from a2a.server.tasks import (
 )
 from a2a.types import (AgentCard, AgentSkill, AgentCapabilities)
 from agent_executor import OrchestratorAgentExecutor
+from agent import close_http_client
 
 @click.command()
 @click.option('--host', 'host', default='localhost')
@@ -60,7 +62,14 @@ def main(host, port):
             agent_card=agent_card, http_handler=request_handler
         )
 
-        uvicorn.run(server.build(), host=host, port=port)
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            yield
+            # Release pooled connections (agent calls and push notifications) on shutdown
+            await close_http_client()
+            await httpx_client.aclose()
+
+        uvicorn.run(server.build(lifespan=lifespan), host=host, port=port)
     except Exception as e:
         logging.error(f'Error starting Orchestrator agent: {e}')
         sys.exit(1)
@@ -1,15 +1,24 @@
 import os
+import re
+import string
+import time
+import hashlib
+import functools
+import asyncio
 import httpx
 import uuid
 import logging
 from typing import TypedDict, List, Dict, Optional, Any
-import json
+import orjson
 from pathlib import Path
+from collections import OrderedDict
 import zipfile # Import zipfile
 
 from langchain_core.pydantic_v1 import BaseModel, Field
+from langchain_core.caches import InMemoryCache
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
 from a2a.client import A2AClient, A2ACardResolver
 from a2a.types import MessageSendParams, SendMessageRequest
 from langchain_core.prompts import ChatPromptTemplate
@@ -25,6 +34,13 @@ class GeneratedFile(BaseModel):
 class CodeGenerationResult(BaseModel):
     files: list[GeneratedFile] = Field(description="List of generated source files.")
 
+class ContextCodeGenerationResult(BaseModel):
+    context_key: str = Field(description="The context key exactly as given in the request.")
+    files: list[GeneratedFile] = Field(description="List of generated source files for this context.")
+
+class BatchCodeGenerationResult(BaseModel):
+    results: list[ContextCodeGenerationResult] = Field(description="One entry per requested context.")
+
 CODEGEN_SYSTEM_INSTRUCTION = """
 You are an expert Java Spring Boot Architect and Developer.
 Your task is to generate a production-ready Microservice based on the provided UML Class Diagram.
@@ -71,13 +87,39 @@ AGENT_REGISTRY = {
     "eventstorming": "http://localhost:10006",
     "uml": "http://localhost:10005",
 }
+# Upper bound on concurrent UML agent calls during the 'uml' task
+UML_MAX_CONCURRENCY = int(os.getenv("UML_MAX_CONCURRENCY", "8"))
+# Upper bound on concurrent code generation LLM calls during the 'codegen' task
+CODEGEN_CONCURRENCY = int(os.getenv("CODEGEN_CONCURRENCY", "4"))
+# Approximate input-token budget for UML models sent together in one codegen request
+# (batches are also capped by element count, see _batch_uml)
+CODEGEN_BATCH_MAX_TOKENS = int(os.getenv("CODEGEN_BATCH_MAX_TOKENS", "6000"))
+
+# Codegen scope requested by the UI: "Generate Java Spring Boot source code for the 'ContextName' context only."
+_TARGET_CONTEXT_RE = re.compile(r"for the '(.+?)' context only", re.IGNORECASE)
+# Removed (after lower-casing) when comparing context names: spaces and the 'uml-' prefix
+_CONTEXT_NAME_NOISE_RE = re.compile(r" |uml-")
+
+def _normalize_context_name(name: str) -> str:
+    return _CONTEXT_NAME_NOISE_RE.sub("", name.lower())
 
 # --- Helper Function for Filenames ---
+# Maps every non-alphanumeric ASCII character to '-'
+_SLUG_ASCII_TABLE = str.maketrans({
+    c: '-' for c in map(chr, range(128)) if c not in string.ascii_letters + string.digits
+})
+
+@functools.lru_cache(maxsize=2048)
 def _slugify(text: str | None) -> str:
     if not text:
         return "generated-board"
     # Basic slugify: replace non-alphanumeric with dash
-    return ''.join(c if c.isalnum() else '-' for c in text).strip('-').lower() or "generated-board"
+    if text.isascii():
+        slug = text.translate(_SLUG_ASCII_TABLE)
+    else:
+        # Keep non-ASCII letters (e.g. Korean context names), as str.isalnum does
+        slug = ''.join(c if c.isalnum() else '-' for c in text)
+    return slug.strip('-').lower() or "generated-board"
 
 
 # --- State Definition ---
@@ -87,13 +129,91 @@ class OrchestrationState(TypedDict):
     plan: List[str]
     eventstorming_result: Optional[dict]
     uml_diagrams: Optional[Dict[str, Any]]
-    generated_code: Optional[Dict[str, str]] # Store generated code summary or content
+    uml_files: Optional[List[Path]] # Saved UML files of an existing project, loaded only when codegen runs
+    generated_code: Optional[Dict[str, Any]] # CodeGenerationResult per context, or an error message
     final_response: Optional[str]
 
+# --- Shared A2A Transport ---
+# One pooled HTTP client and one resolved A2A client per agent, reused across calls
+_http_client: httpx.AsyncClient | None = None
+_a2a_clients: Dict[str, tuple[A2AClient, dict]] = {}
+_a2a_lock = asyncio.Lock()
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=600.0,
+            limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    """Closes the shared HTTP client; called once on server shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    _a2a_clients.clear()
+
+async def _get_a2a_client(agent_name: str, base_url: str) -> tuple[A2AClient, dict]:
+    """Returns the cached A2A client for an agent and its skills indexed by id, resolving the card on first use."""
+    cached = _a2a_clients.get(agent_name)
+    if cached is not None:
+        return cached
+    async with _a2a_lock:
+        cached = _a2a_clients.get(agent_name)
+        if cached is None:
+            client = _get_http_client()
+            resolver = A2ACardResolver(httpx_client=client, base_url=base_url)
+            agent_card = await resolver.get_agent_card()
+            skills_by_id = {s.id: s for s in agent_card.skills}
+            cached = (A2AClient(httpx_client=client, agent_card=agent_card), skills_by_id)
+            _a2a_clients[agent_name] = cached
+    return cached
+
+# --- Agent Response Cache ---
+# Identical requests (e.g. retries of the same board) are answered from memory for a while.
+# Only successful JSON artifacts are cached, as their raw text: each hit parses a fresh object, so callers can mutate it freely.
+AGENT_RESPONSE_CACHE_TTL = float(os.getenv("AGENT_RESPONSE_CACHE_TTL", "300"))
+AGENT_RESPONSE_CACHE_SIZE = int(os.getenv("AGENT_RESPONSE_CACHE_SIZE", "128"))
+_response_cache: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+
+def _response_cache_key(agent_name: str, skill: str, user_query: str) -> str:
+    return hashlib.blake2b(f"{agent_name}|{skill}|{user_query}".encode(), digest_size=16).hexdigest()
+
+def _cached_response(key: str) -> str | None:
+    entry = _response_cache.get(key)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[0] >= AGENT_RESPONSE_CACHE_TTL:
+        del _response_cache[key]
+        return None
+    return entry[1]
+
+def _cache_response(key: str, text: str) -> None:
+    _response_cache[key] = (time.monotonic(), text)
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > AGENT_RESPONSE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
+
+def _is_fallback_board(board) -> bool:
+    """True for the placeholder boards agents return when generation failed (eventstorming error-board, UML FallbackAggregate)."""
+    if isinstance(board, list):
+        return any(_is_fallback_board(b) for b in board)
+    if not isinstance(board, dict):
+        return False
+    if board.get("instanceName") == "error-board":
+        return True
+    return any(
+        isinstance(item, dict) and (item.get("type") == "Error" or item.get("instanceName") == "FallbackAggregate")
+        for item in board.get("items") or ()
+    )
+
 # --- Agent Invocation Logic ---
 async def call_agent(agent_name: str, skill: str, inputs: dict) -> str | dict | list:
     """A generic tool to call any specialized agent via A2A protocol."""
-    logging.info(f"--- ORCHESTRATOR: Calling '{agent_name}' agent for skill '{skill}' with inputs ---")
+    logging.info("--- ORCHESTRATOR: Calling '%s' agent for skill '%s' with inputs ---", agent_name, skill)
     
     base_url = AGENT_REGISTRY.get(agent_name)
     if not base_url:
@@ -101,155 +221,314 @@ async def call_agent(agent_name: str, skill: str, inputs: dict) -> str | dict |
 
     user_query = inputs.get("user_query", "")
 
-    async with httpx.AsyncClient(timeout=600.0) as client:
-        try:
-            resolver = A2ACardResolver(httpx_client=client, base_url=base_url)
-            agent_card = await resolver.get_agent_card()
-            a2a_client = A2AClient(httpx_client=client, agent_card=agent_card)
-            
-            skill_info = next((s for s in agent_card.skills if s.id == skill), None)
-            if not skill_info:
-                return f"Error: Skill '{skill}' not found for agent '{agent_name}'."
-
-            request = SendMessageRequest(
-                id=str(uuid.uuid4()),
-                params=MessageSendParams(
-                    skill=skill,
-                    message=a2a.types.Message(
-                        messageId=uuid.uuid4().hex,
-                        role="user",
-                        parts=[a2a.types.Part(root=a2a.types.TextPart(text=user_query))]
-                    )
+    cache_key = _response_cache_key(agent_name, skill, user_query)
+    cached_text = _cached_response(cache_key)
+    if cached_text is not None:
+        logging.info("Using cached response from '%s' for skill '%s'", agent_name, skill)
+        return orjson.loads(cached_text)
+
+    try:
+        a2a_client, skills_by_id = await _get_a2a_client(agent_name, base_url)
+        
+        skill_info = skills_by_id.get(skill)
+        if not skill_info:
+            return f"Error: Skill '{skill}' not found for agent '{agent_name}'."
+
+        request = SendMessageRequest(
+            id=str(uuid.uuid4()),
+            params=MessageSendParams(
+                skill=skill,
+                message=a2a.types.Message(
+                    messageId=uuid.uuid4().hex,
+                    role="user",
+                    parts=[a2a.types.Part(root=a2a.types.TextPart(text=user_query))]
                 )
             )
-            
-            response_task = await a2a_client.send_message(request)
-            response_dict = response_task.model_dump(exclude_none=True)
-            
-            result_obj = response_dict.get("result", {})
-            
-            if result_obj:
-                artifacts = result_obj.get("artifacts")
-                if artifacts and isinstance(artifacts, list) and len(artifacts) > 0:
-                    artifact = artifacts[0]
-                    parts = artifact.get("parts")
-                    if parts and isinstance(parts, list) and len(parts) > 0:
-                        part_obj = parts[0]
-                        text_content = part_obj.get("text")
-                        if text_content:
-                            try:
-                                return json.loads(text_content)
-                            except json.JSONDecodeError:
-                                # If it's not JSON, return as text (e.g. code summary)
-                                return text_content
-
-            status_obj = result_obj.get("status", {})
-            if status_obj:
-                message_obj = status_obj.get("message", {})
-                status_message_text = message_obj.get("text")
-                if status_message_text:
-                    return status_message_text
-
-            logging.error(
-                f"Failed to extract a valid artifact or status message from '{agent_name}'. "
-                f"Full response dictionary: {json.dumps(response_dict, indent=2)}"
+        )
+        
+        response_task = await a2a_client.send_message(request)
+        # Pretty-printing a multi-megabyte board is expensive, so only do it when DEBUG is actually enabled
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(
+                "RAW RESPONSE from %s: %s", agent_name,
+                orjson.dumps(response_task.model_dump(exclude_none=True), option=orjson.OPT_INDENT_2).decode()
             )
-            return f"Error: Invalid or empty response from {agent_name}."
 
-        except Exception as e:
-            logging.error(f"An exception occurred while calling agent '{agent_name}': {e}", exc_info=True)
-            return f"Error: Exception while communicating with agent '{agent_name}'."
+        # Read result.artifacts[0].parts[0].text straight off the response model instead of dumping it to a dict
+        response = getattr(response_task, "root", response_task)
+        result_obj = getattr(response, "result", None)
+        
+        artifacts = getattr(result_obj, "artifacts", None)
+        if artifacts:
+            parts = artifacts[0].parts
+            if parts:
+                text_content = getattr(getattr(parts[0], "root", parts[0]), "text", None)
+                if text_content:
+                    try:
+                        parsed = orjson.loads(text_content)
+                    except orjson.JSONDecodeError:
+                        # If it's not JSON, return as text (e.g. code summary)
+                        return text_content
+                    # Failures come back as placeholder boards; caching one would replay the failure on retry
+                    if AGENT_RESPONSE_CACHE_TTL > 0 and not _is_fallback_board(parsed):
+                        _cache_response(cache_key, text_content)
+                    return parsed
+
+        status_obj = getattr(result_obj, "status", None)
+        if status_obj:
+            status_message_text = getattr(getattr(status_obj, "message", None), "text", None)
+            if status_message_text:
+                return status_message_text
+
+        # Lazy %-formatting: the (possibly large) response is only stringified if the record is emitted
+        logging.error(
+            "Failed to extract a valid artifact or status message from '%s'. Full response: %s",
+            agent_name, response_task
+        )
+        return f"Error: Invalid or empty response from {agent_name}."
 
+    except Exception as e:
+        logging.error("An exception occurred while calling agent '%s': %s", agent_name, e, exc_info=True)
+        # The agent may have restarted with a different card; resolve it again on the next call
+        _a2a_clients.pop(agent_name, None)
+        return f"Error: Exception while communicating with agent '{agent_name}'."
 
-import glob # Import glob
 
 # --- Internal Code Generation Function ---
-async def _generate_code_internal(uml_data: dict) -> str:
-    """Generates Spring Boot code from UML data using internal LLM."""
-    try:
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        llm = ChatOpenAI(
-            api_key=openai_api_key,
+CODEGEN_MODEL = os.getenv('OPENAI_API_MODEL', 'openai/gpt-oss-120b')
+# Faster model for small contexts (fewer than CODEGEN_SMALL_MODEL_MAX_ELEMENTS classes and connections)
+CODEGEN_MODEL_SMALL = os.getenv('OPENAI_API_MODEL_SMALL', 'openai/gpt-oss-20b')
+CODEGEN_SMALL_MODEL_MAX_ELEMENTS = int(os.getenv("CODEGEN_SMALL_MODEL_MAX_ELEMENTS", "10"))
+
+# Responses are cached by prompt and model, so regenerating code for an unchanged UML model is free.
+_codegen_cache = InMemoryCache(maxsize=int(os.getenv("CODEGEN_CACHE_SIZE", "256")))
+# One client per model, shared across all codegen calls so concurrent requests reuse one HTTP connection pool.
+_codegen_llms: Dict[str, ChatOpenAI] = {}
+
+def _get_codegen_llm(model: str) -> ChatOpenAI:
+    llm = _codegen_llms.get(model)
+    if llm is None:
+        llm = _codegen_llms[model] = ChatOpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
             base_url=os.getenv('OPENAI_API_BASE_URL'),
-            model=os.getenv('OPENAI_API_MODEL', 'openai/gpt-oss-120b'),
+            model=model,
             temperature=0.1,
+            cache=_codegen_cache,
+            # Optional routing hint for providers that cache identical prompt prefixes (e.g. OpenAI's prompt_cache_key)
+            model_kwargs=(
+                {"extra_body": {"prompt_cache_key": os.getenv("CODEGEN_PROMPT_CACHE_KEY")}}
+                if os.getenv("CODEGEN_PROMPT_CACHE_KEY") else {}
+            ),
         )
-        
+    return llm
+
+def _uml_element_count(uml_data: dict) -> int:
+    # Classes plus connections; a cheap proxy for how much code a context needs
+    return sum(len(v) for v in uml_data.values() if isinstance(v, list))
+
+def _pick_model(element_count: int) -> str:
+    return CODEGEN_MODEL_SMALL if element_count < CODEGEN_SMALL_MODEL_MAX_ELEMENTS else CODEGEN_MODEL
+
+# Built once and kept byte-identical as the leading message so providers can reuse the cached prefix;
+# all per-request content (the UML JSON) goes into the following HumanMessage.
+CODEGEN_SYSTEM_MESSAGE = SystemMessage(content=CODEGEN_SYSTEM_INSTRUCTION)
+
+# Layout/styling keys the UI needs but code generation does not; dropped to save input tokens
+_UML_UI_KEYS = frozenset({"x", "y", "width", "height", "style", "color"})
+
+def _prune_ui_keys(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _prune_ui_keys(v) for k, v in value.items() if k not in _UML_UI_KEYS}
+    if isinstance(value, list):
+        return [_prune_ui_keys(v) for v in value]
+    return value
+
+def _serialize_uml(uml_data: dict) -> str:
+    # Compact JSON: indentation only adds tokens the model has to read
+    return orjson.dumps(_prune_ui_keys(uml_data)).decode()
+
+def _approx_tokens(text: str) -> int:
+    # Rough estimate (~4 characters per token); only used to size batches
+    return len(text) // 4 + 1
+
+def _batch_uml(uml_items: list[tuple[str, dict]], element_counts: dict[str, int]) -> list[dict[str, str]]:
+    """
+    Groups (context_key, uml_data) pairs into batches of serialized UML.
+    Only small contexts are batched: a batch's total element count stays below CODEGEN_SMALL_MODEL_MAX_ELEMENTS
+    (so it is still routed to the small model and its output stays short) and its estimated input size within
+    CODEGEN_BATCH_MAX_TOKENS. Larger contexts get a request of their own and run concurrently.
+    """
+    batches = []
+    current: dict[str, str] = {}
+    current_tokens = current_elements = 0
+    for context_key, uml_data in uml_items:
+        serialized = _serialize_uml(uml_data)
+        tokens = _approx_tokens(serialized)
+        elements = element_counts[context_key]
+        if elements >= CODEGEN_SMALL_MODEL_MAX_ELEMENTS or tokens > CODEGEN_BATCH_MAX_TOKENS:
+            batches.append({context_key: serialized})
+            continue
+        if current and (current_tokens + tokens > CODEGEN_BATCH_MAX_TOKENS
+                        or current_elements + elements >= CODEGEN_SMALL_MODEL_MAX_ELEMENTS):
+            batches.append(current)
+            current, current_tokens, current_elements = {}, 0, 0
+        current[context_key] = serialized
+        current_tokens += tokens
+        current_elements += elements
+    if current:
+        batches.append(current)
+    return batches
+
+def _codegen_run_config(context_keys) -> dict:
+    """Tags an LLM call with the contexts it generates, so its streamed tokens can be told apart from concurrent batches."""
+    return {"metadata": {"codegen_contexts": ", ".join(context_keys)}}
+
+async def _generate_code_internal(uml_json: str, model: str = CODEGEN_MODEL, context_key: str | None = None) -> CodeGenerationResult | str:
+    """Generates Spring Boot code from a serialized UML model using internal LLM. Returns an error message string on failure."""
+    try:
         messages = [
-            SystemMessage(content=CODEGEN_SYSTEM_INSTRUCTION),
-            HumanMessage(content=f"Generate Java Spring Boot code for this UML model:\n\n{json.dumps(uml_data, indent=2)}")
+            CODEGEN_SYSTEM_MESSAGE,
+            HumanMessage(content=f"Generate Java Spring Boot code for this UML model:\n\n{uml_json}")
         ]
 
-        structured_llm = llm.with_structured_output(CodeGenerationResult)
-        result = await structured_llm.ainvoke(messages)
+        structured_llm = _get_codegen_llm(model).with_structured_output(CodeGenerationResult)
+        config = _codegen_run_config([context_key]) if context_key else None
+        result = await structured_llm.ainvoke(messages, config=config)
 
         if result and result.files:
-            summary = f"## Generated Spring Boot Project\n\n"
-            for file in result.files:
-                summary += f"### `{file.path}`\n"
-                summary += f"```java\n{file.content}\n```\n\n"
-            return summary
+            return result
         else:
             return "Failed to generate code. The model might be empty or invalid."
 
     except Exception as e:
-        logging.error(f"Internal code generation failed: {e}")
+        logging.error("Internal code generation failed: %s", e)
         return f"An error occurred during code generation: {str(e)}"
 
+async def _generate_code_batch(uml_batch: dict[str, str], model: str = CODEGEN_MODEL) -> dict[str, CodeGenerationResult | str]:
+    """Generates code for several UML models in one request so the shared system prompt is sent once."""
+    if len(uml_batch) == 1:
+        (context_key, uml_json), = uml_batch.items()
+        return {context_key: await _generate_code_internal(uml_json, model, context_key)}
 
-# --- Node Functions ---
-async def planner_node(state: OrchestrationState) -> dict:
+    sections = "\n\n".join(
+        f"### Context key: {context_key}\n{uml_json}" for context_key, uml_json in uml_batch.items()
+    )
+    try:
+        messages = [
+            CODEGEN_SYSTEM_MESSAGE,
+            HumanMessage(content=(
+                "For EACH of the following UML models, generate a separate Java Spring Boot microservice. "
+                "Return one result per model and use its context key exactly as given.\n\n"
+                f"{sections}"
+            ))
+        ]
+
+        structured_llm = _get_codegen_llm(model).with_structured_output(BatchCodeGenerationResult)
+        result = await structured_llm.ainvoke(messages, config=_codegen_run_config(uml_batch))
+        by_key = {r.context_key: r for r in (result.results if result else []) if r.files}
+    except Exception as e:
+        logging.error("Batched code generation failed, retrying contexts one by one: %s", e)
+        by_key = {}
+
+    results: dict[str, CodeGenerationResult | str] = {
+        context_key: CodeGenerationResult(files=by_key[context_key].files)
+        for context_key in uml_batch if context_key in by_key
+    }
+    # Contexts the batch call lost (failed request or missing/empty result) get a request of their own
+    missing = [context_key for context_key in uml_batch if context_key not in results]
+    if missing:
+        if by_key:
+            logging.warning("Batched code generation returned no result for %s; retrying individually", ", ".join(missing))
+        retried = await asyncio.gather(*(
+            _generate_code_internal(uml_batch[context_key], model, context_key) for context_key in missing
+        ))
+        results.update(zip(missing, retried))
+    return {context_key: results[context_key] for context_key in uml_batch}
+
+
+# --- UML File Loading ---
+# Parsed UML files keyed by path and validated against (mtime_ns, size), so unchanged files are parsed once
+_uml_cache: Dict[str, tuple[int, int, dict]] = {}
+# uml-*.json listings per project directory, validated against the directory's mtime_ns
+_uml_listing_cache: Dict[str, tuple[int, list[Path]]] = {}
+
+async def _load_uml(path: Path) -> dict:
+    """Reads and parses a UML file off the event loop, reusing the parsed result while the file is unchanged."""
+    st = await asyncio.to_thread(path.stat)
+    cached = _uml_cache.get(str(path))
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    data = orjson.loads(await asyncio.to_thread(path.read_bytes))
+    _uml_cache[str(path)] = (st.st_mtime_ns, st.st_size, data)
+    return data
+
+async def _list_uml_files(project_dir: Path) -> list[Path]:
+    mtime_ns = (await asyncio.to_thread(project_dir.stat)).st_mtime_ns
+    cached = _uml_listing_cache.get(str(project_dir))
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    uml_files = await asyncio.to_thread(lambda: sorted(project_dir.glob("uml-*.json")))
+    _uml_listing_cache[str(project_dir)] = (mtime_ns, uml_files)
+    return uml_files
+
+
+# Project directories under data/, validated against the data directory's mtime_ns
+_projects_cache: tuple[int, list[tuple[str, Path]]] | None = None
+
+def _scan_projects(data_dir: Path) -> list[tuple[str, Path]]:
+    global _projects_cache
+    try:
+        mtime_ns = data_dir.stat().st_mtime_ns
+    except FileNotFoundError:
+        return []
+    if _projects_cache is None or _projects_cache[0] != mtime_ns:
+        projects = sorted((p.name, p) for p in data_dir.iterdir() if p.is_dir())
+        _projects_cache = (mtime_ns, projects)
+    return _projects_cache[1]
+
+async def _list_projects(data_dir: Path) -> list[tuple[str, Path]]:
+    """Lists project directories under data_dir (empty if it does not exist); the scan runs off the event loop."""
+    return await asyncio.to_thread(_scan_projects, data_dir)
+
+
+# --- Planning (runs in execute_graph, before the graph starts) ---
+async def plan_workflow(state: OrchestrationState) -> dict:
     """Creates a plan. Checks if code gen is requested for existing project."""
-    logging.info("Planner Node: Creating execution plan.")
+    logging.info("Planning: Creating execution plan.")
     user_input = state.get("user_input", "").lower()
     
     # Default plan
     plan = ["eventstorming", "uml"]
-    uml_diagrams = {}
     
     # 1. Check if user wants to generate code for an EXISTING project
     # Heuristic: Look for project names in the input that match folders in 'data/'
     data_dir = Path("data")
-    if data_dir.exists():
-        for project_dir in data_dir.iterdir():
-            if project_dir.is_dir():
-                project_name = project_dir.name
-                # Check if project name is in user input (e.g. "code for onlineshoppingmall")
-                if project_name in user_input.replace(" ", ""): 
-                    logging.info(f"Planner: Detected existing project '{project_name}'. Checking for UML files...")
-                    
-                    # Find UML files
-                    uml_files = list(project_dir.glob("uml-*.json"))
-                    if uml_files:
-                        logging.info(f"Planner: Found {len(uml_files)} UML files. Skipping design phase.")
-                        
-                        # Load UML files into state
-                        for uml_file in uml_files:
-                            try:
-                                with uml_file.open("r", encoding="utf-8") as f:
-                                    uml_data = json.load(f)
-                                    # Use filename or instanceName as key
-                                    key = uml_file.stem
-                                    uml_diagrams[key] = uml_data
-                            except Exception as e:
-                                logging.error(f"Failed to load UML file {uml_file}: {e}")
-                        
-                        if uml_diagrams:
-                            # Set plan to ONLY codegen
-                            plan = ["codegen"]
-                            return {"plan": plan, "uml_diagrams": uml_diagrams}
-    
+    needle = user_input.replace(" ", "")
+    if needle:
+        for project_name, project_dir in await _list_projects(data_dir):
+            # Check if project name is in user input (e.g. "code for onlineshoppingmall")
+            if project_name in needle: 
+                logging.info("Planning: Detected existing project '%s'. Checking for UML files...", project_name)
+                
+                # Find UML files
+                uml_files = await _list_uml_files(project_dir)
+                if uml_files:
+                    logging.info("Planning: Found %s UML files. Skipping design phase.", len(uml_files))
+                    # Only the paths go into state; the codegen step reads and parses them
+                    return {"plan": ["codegen"], "uml_files": uml_files}
+
     # 2. If not existing project, check if codegen is requested for NEW project
     if "code" in user_input or "generate" in user_input or "java" in user_input or "spring" in user_input:
         if "codegen" not in plan:
             plan.append("codegen")
-        logging.info("Planner: Added 'codegen' to full plan.")
+        logging.info("Planning: Added 'codegen' to full plan.")
         
     return {"plan": plan}
 
+# --- Node Functions ---
 async def execution_node(state: OrchestrationState) -> dict:
     """Executes tasks based on the plan."""
-    plan = state.get("plan", [])
+    plan = state.get("plan") or ()
     if not plan:
         return {}
 
@@ -268,9 +547,9 @@ async def execution_node(state: OrchestrationState) -> dict:
         if isinstance(result, dict):
             updated_state["eventstorming_result"] = result
         else:
-            logging.error(f"Eventstorming agent returned an error: {result}")
+            logging.error("Eventstorming agent returned an error: %s", result)
             updated_state["plan"] = [] 
-            updated_state["final_response"] = json.dumps({"error": "Eventstorming failed.", "details": result})
+            updated_state["final_response"] = orjson.dumps({"error": "Eventstorming failed.", "details": result}).decode()
 
     elif current_task == "uml":
         logging.info("Execution Node: Executing 'uml' task.")
@@ -279,8 +558,15 @@ async def execution_node(state: OrchestrationState) -> dict:
             logging.warning("No valid eventstorming contexts found to generate UML.")
             return {"plan": remaining_plan}
 
-        all_items = event_context.get("items", [])
-        contexts = [item for item in all_items if isinstance(item, dict) and item.get("type") == "ContextBox"]
+        # One pass over the board: collect the contexts and group every item under its parent
+        contexts = []
+        children_by_parent: dict[str, list] = {}
+        for item in event_context.get("items", []):
+            if not isinstance(item, dict):
+                continue
+            if item.get("type") == "ContextBox":
+                contexts.append(item)
+            children_by_parent.setdefault(item.get("parent"), []).append(item)
         
         if not contexts:
             logging.warning("No 'ContextBox' items found.")
@@ -288,11 +574,25 @@ async def execution_node(state: OrchestrationState) -> dict:
             
         uml_diagrams = {}
         project_name = event_context.get("instanceName", "untitled-project")
+        semaphore = asyncio.Semaphore(UML_MAX_CONCURRENCY)
+
+        async def _draw_uml(context_name: str, context_payload: dict):
+            async with semaphore:
+                logging.info("Generating UML for: %s", context_name)
+                return await call_agent(
+                    "uml",
+                    "draw_uml_diagram",
+                    {"user_query": orjson.dumps(context_payload).decode()}
+                )
 
-        for context_box in contexts:
+        # Progress events go out on the graph's "custom" stream as each diagram finishes
+        write_progress = get_stream_writer()
+        context_names = []
+        uml_tasks = {}
+        for index, context_box in enumerate(contexts):
             context_id = context_box.get("id")
             context_name = context_box.get("instanceName", f"context-{context_id}")
-            child_items = [item for item in all_items if item.get("parent") == context_id]
+            child_items = children_by_parent.get(context_id, [])
             
             context_payload = {
                 "project_name": project_name,
@@ -300,23 +600,33 @@ async def execution_node(state: OrchestrationState) -> dict:
                 "context_description": context_box.get("description", ""),
                 "items": child_items
             }
-            
-            logging.info(f"Generating UML for: {context_name}")
-            uml_result = await call_agent(
-                "uml", 
-                "draw_uml_diagram",
-                {"user_query": json.dumps(context_payload)}
-            )
-            
+            context_names.append(context_name)
+            uml_tasks[asyncio.create_task(_draw_uml(context_name, context_payload))] = index
+
+        # The UML calls are independent, so run them concurrently (bounded by the semaphore)
+        # and report each one as soon as it completes rather than after the slowest
+        uml_results = [None] * len(contexts)
+        pending = set(uml_tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = uml_tasks[task]
+                uml_results[index] = task.exception() or task.result()
+                write_progress({"type": "uml_partial", "context": context_names[index]})
+
+        for context_box, context_name, uml_result in zip(contexts, context_names, uml_results):
+            if isinstance(uml_result, Exception):
+                uml_result = f"Error: {uml_result}"
+
             if isinstance(uml_result, dict):
                 uml_diagrams[context_name] = uml_result
                 
                 # Update ContextBox with linked diagram reference
                 uml_filename = f"uml-{_slugify(uml_result.get('instanceName', context_name))}.json"
                 context_box["linkedDiagram"] = uml_filename
-                logging.info(f"Linked UML '{uml_filename}' to ContextBox '{context_name}'")
+                logging.info("Linked UML '%s' to ContextBox '%s'", uml_filename, context_name)
             else:
-                logging.error(f"Failed to generate UML for {context_name}: {uml_result}")
+                logging.error("Failed to generate UML for %s: %s", context_name, uml_result)
                 uml_diagrams[context_name] = {"error": uml_result}
 
         updated_state["uml_diagrams"] = uml_diagrams
@@ -326,6 +636,18 @@ async def execution_node(state: OrchestrationState) -> dict:
     elif current_task == "codegen":
         logging.info("Execution Node: Executing 'codegen' task.")
         uml_diagrams = state.get("uml_diagrams")
+        uml_files = state.get("uml_files")
+        if not uml_diagrams and uml_files:
+            # Existing project: load the UML files found while planning
+            uml_diagrams = {}
+            loaded = await asyncio.gather(*(_load_uml(f) for f in uml_files), return_exceptions=True)
+            for uml_file, uml_data in zip(uml_files, loaded):
+                if isinstance(uml_data, Exception):
+                    logging.error("Failed to load UML file %s: %s", uml_file, uml_data)
+                    continue
+                # Use filename as key
+                uml_diagrams[uml_file.stem] = uml_data
+            updated_state["uml_diagrams"] = uml_diagrams
         if not uml_diagrams:
             logging.warning("No UML diagrams available for code generation.")
             return {"plan": remaining_plan}
@@ -334,13 +656,13 @@ async def execution_node(state: OrchestrationState) -> dict:
         
         # Check if user requested specific context only
         # Prompt format from UI: "Generate Java Spring Boot source code for the 'ContextName' context only."
-        import re
         target_context = None
-        match = re.search(r"for the '(.+?)' context only", state.get("user_input", ""), re.IGNORECASE)
+        match = _TARGET_CONTEXT_RE.search(state.get("user_input", ""))
         if match:
-            target_context = match.group(1)
-            logging.info(f"Codegen restricted to context: '{target_context}'")
+            target_context = _normalize_context_name(match.group(1))
+            logging.info("Codegen restricted to context: '%s'", match.group(1))
         
+        eligible = []
         for context_key, uml_data in uml_diagrams.items():
             if "error" in uml_data:
                 continue
@@ -350,18 +672,35 @@ async def execution_node(state: OrchestrationState) -> dict:
             uml_instance_name = uml_data.get("instanceName", "")
             if target_context:
                 # Normalize for comparison (ignore case, spaces, 'uml-' prefix)
-                def normalize(s): return s.lower().replace(" ", "").replace("uml-", "")
-                
-                is_match = (normalize(target_context) == normalize(context_key) or 
-                            normalize(target_context) == normalize(uml_instance_name))
+                is_match = (target_context == _normalize_context_name(context_key) or 
+                            target_context == _normalize_context_name(uml_instance_name))
                 
                 if not is_match:
                     continue
 
-            logging.info(f"Generating Code for: {context_key}")
-            # Use internal function instead of calling agent
-            code_result = await _generate_code_internal(uml_data)
-            generated_code_results[context_key] = code_result
+            eligible.append((context_key, uml_data))
+
+        # Small models are grouped into one request each; the batches themselves run concurrently
+        element_counts = {context_key: _uml_element_count(uml_data) for context_key, uml_data in eligible}
+        batches = _batch_uml(eligible, element_counts)
+        semaphore = asyncio.Semaphore(CODEGEN_CONCURRENCY)
+
+        async def _generate(uml_batch: dict[str, str]) -> dict:
+            # Route small batches to the faster model
+            model = _pick_model(sum(element_counts[context_key] for context_key in uml_batch))
+            async with semaphore:
+                logging.info("Generating Code with %s for: %s", model, ', '.join(uml_batch))
+                # Use internal function instead of calling agent
+                return await _generate_code_batch(uml_batch, model)
+
+        batch_results = await asyncio.gather(*(_generate(b) for b in batches), return_exceptions=True)
+        for uml_batch, batch_result in zip(batches, batch_results):
+            if isinstance(batch_result, Exception):
+                batch_result = {
+                    context_key: f"An error occurred during code generation: {batch_result}"
+                    for context_key in uml_batch
+                }
+            generated_code_results.update(batch_result)
             
         updated_state["generated_code"] = generated_code_results
 
@@ -369,12 +708,20 @@ async def execution_node(state: OrchestrationState) -> dict:
 
 def should_continue(state: OrchestrationState) -> str:
     """Determines the next step."""
-    if state.get("plan") and len(state["plan"]) > 0:
-        return "execution"
-    else:
-        return "final_response"
+    return "execution" if state.get("plan") else "final_response"
 
-def final_response_node(state: OrchestrationState) -> dict:
+def _write_file(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+def _write_zip(zip_file_path: Path, entries: dict[str, bytes]) -> None:
+    # Entries come straight from memory, so nothing is re-read from disk.
+    # JSON and source text compress well even at level 1, which is much cheaper than the default.
+    with zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+        for arcname, data in entries.items():
+            zipf.writestr(arcname, data)
+
+async def final_response_node(state: OrchestrationState) -> dict:
     """Aggregates results, saves files, zips code, and prepares final output."""
     logging.info("Final Response Node: Aggregating results...")
     
@@ -382,116 +729,153 @@ def final_response_node(state: OrchestrationState) -> dict:
     if final_response_content and "error" in final_response_content:
         return {"final_response": final_response_content}
 
+    # Anything that is not a dict is treated as missing, so the checks below are plain None tests
     event_payload = state.get("eventstorming_result")
+    if not isinstance(event_payload, dict):
+        event_payload = None
     uml_diagrams_payload = state.get("uml_diagrams")
+    if not isinstance(uml_diagrams_payload, dict):
+        uml_diagrams_payload = None
     generated_code_payload = state.get("generated_code")
 
     # --- Save files to disk ---
     try:
-        project_name = "untitled-project"
-        if isinstance(event_payload, dict):
-            project_name = _slugify(event_payload.get("instanceName"))
-        
+        has_board = event_payload is not None
+        project_name = _slugify(event_payload.get("instanceName")) if has_board else "untitled-project"
         project_dir = Path("data") / project_name
-        project_dir.mkdir(parents=True, exist_ok=True)
+        json_option = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
 
         # Save Eventstorming
-        if isinstance(event_payload, dict):
-            with (project_dir / f"{project_name}.json").open("w", encoding="utf-8") as f:
-                json.dump(event_payload, f, ensure_ascii=False, indent=2)
+        # (path relative to project_dir, content) for every artifact; used for both the files and the zip
+        files_to_write: list[tuple[str, bytes]] = (
+            [(f"{project_name}.json", orjson.dumps(event_payload, option=json_option))] if has_board else []
+        )
 
         # Save UML
-        if isinstance(uml_diagrams_payload, dict):
-            for context_name, uml_payload in uml_diagrams_payload.items():
-                if isinstance(uml_payload, dict):
-                    uml_filename = f"uml-{_slugify(uml_payload.get('instanceName'))}.json"
-                    with (project_dir / uml_filename).open("w", encoding="utf-8") as f:
-                        json.dump(uml_payload, f, ensure_ascii=False, indent=2)
-
-        # Save Generated Code & Zip
-        zip_path = None
+        if uml_diagrams_payload is not None:
+            files_to_write.extend(
+                (f"uml-{_slugify(uml_payload.get('instanceName'))}.json", orjson.dumps(uml_payload, option=json_option))
+                for uml_payload in uml_diagrams_payload.values()
+                if isinstance(uml_payload, dict)
+            )
+
+        # Save Generated Code
         if generated_code_payload:
-            src_dir = project_dir / "src"
-            src_dir.mkdir(exist_ok=True)
-            
-            # Parse the generated code text to extract files
-            # The agent returns a markdown summary. We need to parse it or change the agent to return JSON.
-            # For now, we'll save the summary as a text file, 
-            # BUT ideally we should have parsed it.
-            # Since I implemented the agent to return a markdown summary, I will save that summary.
-            # To truly save individual files, I would need to change the agent to return JSON artifacts.
-            # Given the constraints, I will save the "Code Summary" to a file.
-            
-            # Wait, the user wants a ZIP file.
-            # I should try to extract the code blocks from the markdown if possible, 
-            # OR just zip the entire project folder including the JSONs and the code summary.
+            project_root = project_dir.resolve()
             
             for context_name, code_content in generated_code_payload.items():
-                code_filename = f"code-{_slugify(context_name)}.md"
-                with (src_dir / code_filename).open("w", encoding="utf-8") as f:
-                    f.write(str(code_content))
-            
-            # Create ZIP
-            zip_filename = f"{project_name}-source.zip"
-            zip_file_path = project_dir / zip_filename
-            
-            with zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(project_dir):
-                    for file in files:
-                        if file == zip_filename: continue # Don't zip the zip itself
-                        file_path = Path(root) / file
-                        arcname = file_path.relative_to(project_dir)
-                        zipf.write(file_path, arcname)
-            
+                if isinstance(code_content, CodeGenerationResult):
+                    # Each context is its own service, so give it its own source root
+                    context_dir = project_root / "src" / _slugify(context_name)
+                    for generated_file in code_content.files:
+                        file_path = (context_dir / generated_file.path).resolve()
+                        if not file_path.is_relative_to(context_dir):
+                            logging.warning("Skipping generated file outside the project: %s", generated_file.path)
+                            continue
+                        files_to_write.append((
+                            file_path.relative_to(project_root).as_posix(),
+                            generated_file.content.encode("utf-8"),
+                        ))
+                else:
+                    # Generation failed; keep the error message next to the sources
+                    code_filename = f"src/code-{_slugify(context_name)}.md"
+                    files_to_write.append((code_filename, str(code_content).encode("utf-8")))
+
+        # Write everything in parallel on worker threads so the event loop is never blocked on disk I/O.
+        # When code was generated, the zip is built from the same in-memory payloads alongside the writes.
+        await asyncio.to_thread(project_dir.mkdir, parents=True, exist_ok=True)
+        # Two entries can share a path (e.g. UML instanceNames that slugify alike); as with sequential
+        # writes the last one wins, and each path gets exactly one writer and one zip entry
+        unique_files = dict(files_to_write)
+        writes = [asyncio.to_thread(_write_file, project_dir / name, data) for name, data in unique_files.items()]
+        zip_path = None
+        if generated_code_payload:
+            zip_file_path = project_dir / f"{project_name}-source.zip"
+            writes.append(asyncio.to_thread(_write_zip, zip_file_path, unique_files))
             zip_path = str(zip_file_path)
-            logging.info(f"Created ZIP archive at {zip_path}")
+        await asyncio.gather(*writes)
+        if zip_path:
+            logging.info("Created ZIP archive at %s", zip_path)
 
     except Exception as e:
-        logging.error(f"Orchestrator failed to save/zip files: {e}")
+        logging.error("Orchestrator failed to save/zip files: %s", e)
         zip_path = f"Error creating zip: {e}"
 
     # --- Aggregate results ---
+    # The generated sources themselves are only shipped in the zip; the response lists what was generated
     final_json = {
         "eventstorming": event_payload,
         "uml_diagrams": uml_diagrams_payload,
-        "generated_code_summary": generated_code_payload,
+        "generated_code_summary": {
+            context_name: {
+                "file_count": len(code.files),
+                "files": [generated_file.path for generated_file in code.files],
+            } if isinstance(code, CodeGenerationResult) else code
+            for context_name, code in generated_code_payload.items()
+        } if generated_code_payload is not None else None,
         "download_link": zip_path
     }
-    return {"final_response": json.dumps(final_json, indent=2)}
+    return {"final_response": orjson.dumps(final_json).decode()}
 
 # --- Graph Definition ---
-_app = None
-
-async def get_app():
-    global _app
-    if _app is None:
-        workflow = StateGraph(OrchestrationState)
-        workflow.add_node("planner", planner_node)
-        workflow.add_node("execution", execution_node)
-        workflow.add_node("aggregate_results", final_response_node)
-        
-        workflow.set_entry_point("planner")
-        workflow.add_edge("planner", "execution")
-        workflow.add_conditional_edges(
-            "execution",
-            should_continue,
-            {
-                "execution": "execution",
-                "final_response": "aggregate_results"
-            }
-        )
-        workflow.add_edge("aggregate_results", END)
-        
-        _app = workflow.compile()
-        logging.info("LangGraph app compiled successfully.")
-    return _app
+def _build_app():
+    workflow = StateGraph(OrchestrationState)
+    # Planning runs before the graph (see execute_graph), so the graph starts at execution
+    workflow.add_node("execution", execution_node)
+    workflow.add_node("aggregate_results", final_response_node)
+    
+    workflow.set_entry_point("execution")
+    workflow.add_conditional_edges(
+        "execution",
+        should_continue,
+        {
+            "execution": "execution",
+            "final_response": "aggregate_results"
+        }
+    )
+    workflow.add_edge("aggregate_results", END)
+    
+    # No checkpointer: runs are one-shot, so state persistence would be pure overhead
+    return workflow.compile(checkpointer=None)
+
+# Compiled once at import so no request pays the compile cost (or races to compile it twice)
+_app = _build_app()
+logging.info("LangGraph app compiled successfully.")
+
+def _token_text(message_chunk: Any) -> str:
+    """Extracts the streamed text from an LLM message chunk, including structured-output tool call arguments."""
+    content = getattr(message_chunk, "content", None)
+    if isinstance(content, str) and content:
+        return content
+    tool_call_chunks = getattr(message_chunk, "tool_call_chunks", None) or []
+    return "".join(tc.get("args") or "" for tc in tool_call_chunks)
 
 async def execute_graph(initial_state: dict):
-    app = await get_app()
-    async for event in app.astream(initial_state):
-        if "planner" in event:
-            yield {"type": "update", "data": "Workflow plan created."}
-        elif "execution" in event:
+    # The plan is just an input to the graph, so build it up front instead of spending a node hop on it
+    initial_state = {**initial_state, **await plan_workflow(initial_state)}
+    yield {"type": "update", "data": "Workflow plan created."}
+
+    # "messages" streams LLM tokens (code generation) as they are produced, "custom" carries progress
+    # written from inside a node (e.g. each finished UML diagram), and "updates" carries node outputs.
+    async for mode, event in _app.astream(initial_state, stream_mode=["updates", "messages", "custom"]):
+        if mode == "messages":
+            message_chunk, metadata = event
+            token = _token_text(message_chunk)
+            if token:
+                # Several codegen batches stream at once; the run id keeps their tokens apart and the label names them
+                yield {
+                    "type": "token",
+                    "data": token,
+                    "run": getattr(message_chunk, "id", None) or metadata.get("langgraph_checkpoint_ns"),
+                    "label": metadata.get("codegen_contexts") or metadata.get("langgraph_node"),
+                }
+            continue
+        if mode == "custom":
+            if event.get("type") == "uml_partial":
+                yield {"type": "update", "data": f"UML diagram ready for '{event['context']}'."}
+            continue
+
+        if "execution" in event:
             execution_output = event["execution"]
             if execution_output.get("eventstorming_result"):
                  yield {"type": "update", "data": "Eventstorming task complete."}
@@ -13,6 +13,9 @@ from agent import execute_graph
 logging.basicConfig(level=logging.INFO, encoding='utf-8')
 logger = logging.getLogger(__name__)
 
+# Minimum interval (seconds) between status updates carrying streamed LLM tokens
+TOKEN_FLUSH_INTERVAL = 1.0
+
 class OrchestratorAgentExecutor(AgentExecutor):
     """Executes the orchestration graph."""
 
@@ -38,15 +41,43 @@ class OrchestratorAgentExecutor(AgentExecutor):
             }
 
             final_result = None
+            loop = asyncio.get_running_loop()
+            # Buffered tokens per LLM run: run id -> (label, token list)
+            pending_tokens: dict = {}
+            last_token_flush = loop.time()
+            last_update = None
+
+            async def flush_tokens():
+                # One status per run, so concurrent codegen batches don't interleave into one unreadable text
+                for label, tokens in pending_tokens.values():
+                    text = "".join(tokens)
+                    await updater.update_status(
+                        TaskState.working,
+                        new_agent_text_message(f"[{label}] {text}" if label else text, task.context_id, task.id)
+                    )
+                pending_tokens.clear()
+
             async for event in execute_graph(initial_state):
                 if event["type"] == "update":
+                    # Repeated progress messages tell the client nothing new; skip building and sending them
+                    if event["data"] == last_update:
+                        continue
+                    last_update = event["data"]
                     logging.info(f"Streaming update: {event['data']}")
                     await updater.update_status(
                         TaskState.working, 
                         new_agent_text_message(str(event["data"]), task.context_id, task.id)
                     )
+                elif event["type"] == "token":
+                    # Coalesce streamed tokens so the client sees progress without one update per token
+                    pending_tokens.setdefault(event.get("run"), (event.get("label"), []))[1].append(event["data"])
+                    if loop.time() - last_token_flush >= TOKEN_FLUSH_INTERVAL:
+                        await flush_tokens()
+                        last_token_flush = loop.time()
                 elif event["type"] == "result":
                     final_result = event.get("data")
+            # Tokens that arrived after the last timed flush
+            await flush_tokens()
             
             if final_result:
                 logging.info(f"Workflow finished. Final result: {final_result}")
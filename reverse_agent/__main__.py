@@ -1,4 +1,5 @@
 import logging
+import contextlib
 import click
 import httpx
 import uvicorn
@@ -12,6 +13,7 @@ from a2a.server.tasks import (
 )
 from a2a.types import (AgentCard, AgentSkill, AgentCapabilities)
 from agent_executor import ReverseAgentExecutor
+from agent import close_exchange_client
 
 @click.command()
 @click.option('--host', 'host', default='localhost')
@@ -56,7 +58,14 @@ def main(host, port):
             agent_card=agent_card, http_handler=request_handler
         )
 
-        uvicorn.run(server.build(), host=host, port=port)
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            yield
+            # Release pooled connections (exchange rate lookups and push notifications) on shutdown
+            await close_exchange_client()
+            await httpx_client.aclose()
+
+        uvicorn.run(server.build(lifespan=lifespan), host=host, port=port)
     except Exception as e:
         logging.error(f'Error starting reverse agent: {e}')
         sys.exit(1)
@@ -7,17 +7,47 @@ import httpx
 
 from langchain_core.messages import AIMessage, ToolMessage
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.prebuilt import create_react_agent
 from pydantic import BaseModel
 
+# The chat model and graph libraries are imported where they are first used, so importing
+# this module (e.g. for `--help` or when only one agent is built) stays cheap.
 
-memory = MemorySaver()
+_memory = None
+
+
+def _get_memory():
+    """Returns the checkpointer shared by all agents in this process, creating it on first use."""
+    global _memory
+    if _memory is None:
+        from langgraph.checkpoint.memory import MemorySaver
+
+        _memory = MemorySaver()
+    return _memory
+
+
+_exchange_client = None
+
+
+def _get_exchange_client():
+    """Returns the keep-alive client shared by all exchange rate lookups, creating it on first use."""
+    global _exchange_client
+    if _exchange_client is None:
+        _exchange_client = httpx.AsyncClient(
+            timeout=30.0, limits=httpx.Limits(max_keepalive_connections=4)
+        )
+    return _exchange_client
+
+
+async def close_exchange_client() -> None:
+    """Closes the exchange rate client if it was created; called once on server shutdown."""
+    global _exchange_client
+    if _exchange_client is not None:
+        await _exchange_client.aclose()
+        _exchange_client = None
 
 
 @tool
-def get_exchange_rate(
+async def get_exchange_rate(
     currency_from: str = 'USD',
     currency_to: str = 'EUR',
     currency_date: str = 'latest',
@@ -35,7 +65,7 @@ def get_exchange_rate(
         the request fails.
     """
     try:
-        response = httpx.get(
+        response = await _get_exchange_client().get(
             f'https://api.frankfurter.app/{currency_date}',
             params={'from': currency_from, 'to': currency_to},
         )
@@ -91,6 +121,9 @@ class CurrencyAgent:
     )
 
     def __init__(self):
+        from langchain_openai import ChatOpenAI
+        from langgraph.prebuilt import create_react_agent
+
         model_source = os.getenv('model_source', 'google')
         if model_source == 'google':
             self.model = ChatGoogleGenerativeAI(model='gemini-2.0-flash')
@@ -106,7 +139,7 @@ class CurrencyAgent:
         self.graph = create_react_agent(
             self.model,
             tools=self.tools,
-            checkpointer=memory,
+            checkpointer=_get_memory(),
             prompt=self.SYSTEM_INSTRUCTION,
             response_format=(self.FORMAT_INSTRUCTION, ResponseFormat),
         )
@@ -115,7 +148,7 @@ class CurrencyAgent:
         inputs = {'messages': [('user', query)]}
         config = {'configurable': {'thread_id': context_id}}
 
-        for item in self.graph.stream(inputs, config, stream_mode='values'):
+        async for item in self.graph.astream(inputs, config, stream_mode='values'):
             message = item['messages'][-1]
             if (
                 isinstance(message, AIMessage)
@@ -177,6 +210,9 @@ class ReverseAgent:
     """ReverseAgent - a specialized assistant for reverse engineering models from zip files."""
 
     def __init__(self):
+        from langchain_openai import ChatOpenAI
+        from langgraph.prebuilt import create_react_agent
+
         self.system_instruction = (
             'You are a specialized assistant for reverse engineering. '
             "Your sole purpose is to use the 'reverse_engineer_zipfile' tool to create a model from a zip file. "
@@ -197,7 +233,7 @@ class ReverseAgent:
         self.graph = create_react_agent(
             self.llm,
             tools=self.tools,
-            checkpointer=memory,
+            checkpointer=_get_memory(),
         )
 
     async def stream(self, query, context_id) -> AsyncIterable[dict[str, Any]]:
@@ -1,7 +1,8 @@
 import asyncio
 import uuid
 import httpx
-import json
+import orjson
+import re
 import logging
 from pathlib import Path
 
@@ -12,10 +13,22 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 AGENT_URL = "http://localhost:10007/" # The single entry point for all complex tasks
 
 
+# One dash per non-alphanumeric character (Unicode-aware, so Korean names are kept)
+_SLUG_RE = re.compile(r'[\W_]')
+
 def _slugify(text: str | None) -> str:
-    if not text:
-        return "generated-board"
-    return ''.join(c if c.isalnum() else '-' for c in text).strip('-').lower() or "generated-board"
+    return _SLUG_RE.sub('-', text or '').strip('-').lower() or "generated-board"
+
+def _write_json(path: Path, obj) -> None:
+    # Serialized in one go and written with a single call
+    path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+
+def _artifact_text(result_obj) -> str | None:
+    """Returns result.artifacts[0].parts[0].text, or None if any step of the path is missing."""
+    try:
+        return result_obj["artifacts"][0]["parts"][0]["text"] or None
+    except (KeyError, IndexError, TypeError):
+        return None
 
 async def run_orchestration_test():
     """Sends a complex modeling request to the orchestrator agent and saves the results."""
@@ -44,41 +57,37 @@ async def run_orchestration_test():
             
             if response.status_code == 200:
                 logging.info("Request successful. Orchestrator returned a final response.")
-                response_data = response.json()
+                # The body is needed whole (it is printed below), so parse the raw bytes once with orjson
+                response_data = orjson.loads(response.content)
                 
                 print("\n--- Raw JSON Response ---")
-                print(json.dumps(response_data, indent=2))
+                print(orjson.dumps(response_data, option=orjson.OPT_INDENT_2).decode())
 
                 # Simplified and corrected parsing logic based on actual response structure
-                final_text = None
                 result_obj = response_data.get("result", {})
-                
-                if result_obj:
-                    artifacts = result_obj.get("artifacts")
-                    if artifacts and isinstance(artifacts, list) and len(artifacts) > 0:
-                        parts = artifacts[0].get("parts")
-                        if parts and isinstance(parts, list) and len(parts) > 0:
-                            final_text = parts[0].get("text")
+                final_text = _artifact_text(result_obj)
 
                 if final_text:
                     logging.info("SUCCESS: Orchestrator completed the workflow and provided a final artifact.")
                     
                     try:
-                        final_payload = json.loads(final_text)
-                    except json.JSONDecodeError as parse_err:
+                        final_payload = orjson.loads(final_text)
+                    except orjson.JSONDecodeError as parse_err:
                         logging.error(f"Failed to parse final result as JSON: {parse_err}")
                         final_payload = None
 
                     if final_payload:
                         try:
+                            # path -> (payload, description) for every board to save; written concurrently below.
+                            # Boards whose names slugify to the same file replace earlier ones, so each path has one writer.
+                            writes = {}
+
                             event_payload = final_payload.get("eventstorming")
                             if isinstance(event_payload, dict):
                                 event_dir = Path("data/eventstorming")
                                 event_dir.mkdir(parents=True, exist_ok=True)
                                 event_filename = _slugify(event_payload.get("instanceName")) + ".json"
-                                with (event_dir / event_filename).open("w", encoding="utf-8") as f:
-                                    json.dump(event_payload, f, ensure_ascii=False, indent=2)
-                                logging.info(f"Saved eventstorming board to {event_dir / event_filename}")
+                                writes[event_dir / event_filename] = (event_payload, "eventstorming board")
                             elif event_payload:
                                 logging.warning(f"Eventstorming payload was not a dictionary: {event_payload}")
 
@@ -93,19 +102,26 @@ async def run_orchestration_test():
                                     if isinstance(uml_payload, dict):
                                         # Use the instanceName from the UML payload for the filename
                                         uml_filename = _slugify(uml_payload.get("instanceName")) + ".json"
-                                        with (uml_dir / uml_filename).open("w", encoding="utf-8") as f:
-                                            json.dump(uml_payload, f, ensure_ascii=False, indent=2)
-                                        logging.info(f"Saved UML diagram for '{context_name}' to {uml_dir / uml_filename}")
+                                        uml_path = uml_dir / uml_filename
+                                        if uml_path in writes:
+                                            logging.warning(f"{writes[uml_path][1]} and UML diagram for '{context_name}' share {uml_path}; keeping the latter.")
+                                        writes[uml_path] = (uml_payload, f"UML diagram for '{context_name}'")
                                     else:
                                         logging.warning(f"UML payload for '{context_name}' was not a dictionary.")
                             elif uml_diagrams_payload:
                                 logging.warning(f"UML diagrams payload was not a dictionary: {uml_diagrams_payload}")
+
+                            # Write the files in parallel on worker threads instead of one after another on the event loop
+                            await asyncio.gather(*(asyncio.to_thread(_write_json, path, obj) for path, (obj, _) in writes.items()))
+                            for path, (_, description) in writes.items():
+                                logging.info(f"Saved {description} to {path}")
                         except Exception as write_err:
                             logging.error(f"Failed to save board files: {write_err}")
                 else:
                     logging.warning("Could not find a valid artifact in the response.")
                     # Log the result object for debugging if artifact is not found
-                    logging.info(f"Response result object for debugging: {json.dumps(result_obj, indent=2)}")
+                    if logging.getLogger().isEnabledFor(logging.INFO):
+                        logging.info("Response result object for debugging: %s", orjson.dumps(result_obj, option=orjson.OPT_INDENT_2).decode())
 
             else:
                 logging.error(f"Error: Received status code {response.status_code}")
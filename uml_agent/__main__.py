@@ -1,4 +1,5 @@
 import logging
+import contextlib
 import click
 import httpx
 import uvicorn
@@ -17,6 +18,7 @@ from a2a.server.tasks import (
 )
 from a2a.types import (AgentCard, AgentSkill, AgentCapabilities)
 from agent_executor import UmlAgentExecutor
+from agent import close_llm_client
 
 @click.command()
 @click.option('--host', 'host', default='localhost')
@@ -47,7 +49,11 @@ def main(host, port):
             skills=[skill], 
         )
         # --8<-- [start:DefaultRequestHandler]
-        httpx_client = httpx.AsyncClient()
+        # Pooled so push notifications reuse connections instead of reconnecting per delivery
+        httpx_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            timeout=httpx.Timeout(30.0, connect=5.0),
+        )
         push_config_store = InMemoryPushNotificationConfigStore()
         push_sender = BasePushNotificationSender(httpx_client=httpx_client,
                         config_store=push_config_store)
@@ -61,7 +67,13 @@ def main(host, port):
             agent_card=agent_card, http_handler=request_handler
         )
 
-        uvicorn.run(server.build(), host=host, port=port)
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            yield
+            await close_llm_client()
+            await httpx_client.aclose()
+
+        uvicorn.run(server.build(lifespan=lifespan), host=host, port=port)
     except Exception as e:
         logging.error(f'Error starting UML agent: {e}')
         sys.exit(1)
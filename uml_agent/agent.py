@@ -1,22 +1,45 @@
-import json
+import orjson
+import re
 import uuid
+import time
+import asyncio
+import hashlib
+import httpx
+from pathlib import Path
+from collections import OrderedDict
 from datetime import datetime
-from langchain_core.pydantic_v1 import BaseModel, Field, parse_obj_as, ValidationError
-from langchain_core.messages import AIMessage
+from pydantic import BaseModel, Field
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
+import openai
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
 import os
 import logging
 
 logging.basicConfig(level=logging.INFO, encoding='utf-8')
 
 # --- LLM for generating domain-specific content ---
+# One pooled client for every LLM call so connections stay warm across requests, retries and hedges
+_llm_http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+)
+
 llm = ChatOpenAI(
     api_key=os.getenv('OPENAI_API_KEY'),
     base_url=os.getenv('OPENAI_API_BASE_URL'),
     model=os.getenv('OPENAI_API_MODEL', 'openai/gpt-oss-120b'),
     temperature=0.2,
+    # Set here rather than on the HTTP client: ChatOpenAI passes its own timeout with every request
+    timeout=httpx.Timeout(60.0, connect=5.0),
+    # Transient failures are retried (with backoff) in _generate_uml_concepts; don't retry twice
+    max_retries=0,
+    http_async_client=_llm_http_client,
 )
 
+async def close_llm_client() -> None:
+    """Closes the pooled HTTP client used for LLM calls."""
+    await _llm_http_client.aclose()
+
 # --- Pydantic Models for UML Generation ---
 class UMLAttribute(BaseModel):
     name: str = Field(description="Attribute name (camelCase).")
@@ -52,19 +75,15 @@ class UMLConcepts(BaseModel):
     classes: list[UMLClass]
     relationships: list[UMLRelationship] = Field(default_factory=list, description="List of relationships between classes.")
 
-async def _generate_uml_concepts(eventstorming_context: dict) -> UMLConcepts | None:
-    context_data = eventstorming_context # Renamed for clarity in prompt
-    prompt = f"""
-    You are an expert software architect and UML designer.
-    Your goal is to generate a detailed Domain-Driven Design (DDD) UML class diagram based on the following Eventstorming context.
-
-    **Context Description:**
-    Project: {context_data.get('project_name')}
-    Context: {context_data.get('context_name')}
-    Description: {context_data.get('context_description')}
+# The model's output is constrained to the UMLConcepts schema, so no fence stripping or JSON repair is needed
+structured_llm = llm.with_structured_output(UMLConcepts, method="json_schema")
 
-    **Items in Context:**
-    {json.dumps(context_data.get('items', []), indent=2, ensure_ascii=False)}
+# Built once at import; each call only fills in the context variables.
+# The static instructions come first and the per-context data last, so every request shares the same
+# prefix and providers with prompt caching can reuse it.
+UML_CONCEPTS_PROMPT = ChatPromptTemplate.from_template("""
+    You are an expert software architect and UML designer.
+    Your goal is to generate a detailed Domain-Driven Design (DDD) UML class diagram based on the Eventstorming context given at the end.
 
     **Instructions:**
     1.  **Identify Classes**: Create UML classes for all Aggregates, Entities, Value Objects, Enums, Commands, Events, Policies, and **Read Models**.
@@ -148,43 +167,194 @@ async def _generate_uml_concepts(eventstorming_context: dict) -> UMLConcepts | N
       ]
     }}
     ```
-    """
-    for i in range(3): # Retry up to 3 times
-        try:
-            raw_response = await llm.ainvoke(prompt)
-            logging.info(f"Raw LLM Output for UML concepts (attempt {i+1}):\n{raw_response}")
-
-            # Clean the response: remove markdown fences and strip whitespace
-            if isinstance(raw_response, AIMessage):
-                cleaned_json_str = raw_response.content.strip()
-            else: # Assuming it's a message object with content
-                cleaned_json_str = raw_response.content.strip()
-            
-            if cleaned_json_str.startswith("```json"):
-                cleaned_json_str = cleaned_json_str[7:]
-            if cleaned_json_str.endswith("```"):
-                cleaned_json_str = cleaned_json_str[:-3]
-            cleaned_json_str = cleaned_json_str.strip()
 
+    **Context Description:**
+    Project: {project_name}
+    Context: {context_name}
+    Description: {context_description}
 
-            data = json.loads(cleaned_json_str)
-            
-            # Validate with Pydantic
-            validated_concepts = UMLConcepts.parse_obj(data)
-            logging.info("Successfully parsed and validated UMLConcepts.")
-            return validated_concepts
-            
-        except (json.JSONDecodeError, Exception) as e:
-            logging.error(f"Failed to parse or validate UML LLM response on attempt {i+1}. Error: {e}")
-            logging.error(f"Raw response that failed: {raw_response}")
-            
-    logging.error("LLM failed to generate valid UML concepts after multiple retries.")
-    return None
+    **Items in Context:**
+    {items}
+    """)
+uml_concepts_chain = UML_CONCEPTS_PROMPT | structured_llm
+
+# Upper bound on concurrent LLM calls when several contexts are generated in one request
+UML_LLM_CONCURRENCY = int(os.getenv("UML_LLM_CONCURRENCY", "5"))
+
+# --- Concept Cache ---
+# Identical contexts (e.g. the orchestrator retrying a board) reuse the concepts generated before.
+# Keys hash the context with sorted keys, so key order does not matter.
+UML_CONCEPTS_CACHE_SIZE = int(os.getenv("UML_CONCEPTS_CACHE_SIZE", "512"))
+UML_CONCEPTS_CACHE_TTL = float(os.getenv("UML_CONCEPTS_CACHE_TTL", "3600"))
+_concepts_cache: "OrderedDict[str, tuple[float, UMLConcepts]]" = OrderedDict()
+
+def _concepts_cache_key(eventstorming_context: dict) -> str:
+    canonical = orjson.dumps(eventstorming_context, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+def _get_cached_concepts(key: str) -> UMLConcepts | None:
+    entry = _concepts_cache.get(key)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[0] >= UML_CONCEPTS_CACHE_TTL:
+        del _concepts_cache[key]
+        return None
+    _concepts_cache.move_to_end(key)
+    return entry[1]
+
+def _cache_concepts(key: str, concepts: UMLConcepts) -> None:
+    _concepts_cache[key] = (time.monotonic(), concepts)
+    _concepts_cache.move_to_end(key)
+    while len(_concepts_cache) > UML_CONCEPTS_CACHE_SIZE:
+        _concepts_cache.popitem(last=False)
+
+# Optional on-disk layer (one JSON file per key) so cached concepts survive restarts; disabled when unset
+UML_CONCEPTS_CACHE_DIR = os.getenv("UML_CONCEPTS_CACHE_DIR")
+
+def _read_persisted_concepts(key: str) -> UMLConcepts | None:
+    path = Path(UML_CONCEPTS_CACHE_DIR) / f"{key}.json"
+    try:
+        if time.time() - path.stat().st_mtime >= UML_CONCEPTS_CACHE_TTL:
+            return None
+        return UMLConcepts.model_validate_json(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning("Ignoring unreadable UML concepts cache entry %s: %s", path, e)
+        return None
+
+def _persist_concepts(key: str, concepts: UMLConcepts) -> None:
+    cache_dir = Path(UML_CONCEPTS_CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    (cache_dir / f"{key}.json").write_text(concepts.model_dump_json(), encoding="utf-8")
+
+# Number of identical concept requests raced per attempt; the first valid answer wins and the rest are cancelled.
+# Trades extra tokens for lower tail latency, so it is off (1) unless configured.
+UML_HEDGED_REQUESTS = max(1, int(os.getenv("UML_HEDGED_REQUESTS", "1")))
+
+async def _ainvoke_concepts(prompt_inputs: dict) -> UMLConcepts:
+    if UML_HEDGED_REQUESTS == 1:
+        return await uml_concepts_chain.ainvoke(prompt_inputs)
+
+    pending = {asyncio.create_task(uml_concepts_chain.ainvoke(prompt_inputs)) for _ in range(UML_HEDGED_REQUESTS)}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = None
+            # Check every finished task, not just up to the first success, so no exception goes unretrieved
+            for task in done:
+                task_error = task.exception()
+                if task_error is None:
+                    winner = winner or task
+                else:
+                    error = task_error
+            if winner is not None:
+                return winner.result()
+        # Every request failed; surface the last error so the retry policy can classify it
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        # Let the losers finish cancelling before returning
+        await asyncio.gather(*pending, return_exceptions=True)
+
+_TRANSIENT_LLM_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
 
+def _log_retry(retry_state) -> None:
+    error = retry_state.outcome.exception()
+    logging.warning(
+        "Transient %s while generating UML concepts (attempt %d), retrying: %s",
+        type(error).__name__, retry_state.attempt_number, error,
+    )
+
+async def _generate_uml_concepts(eventstorming_context: dict) -> UMLConcepts | None:
+    cache_key = _concepts_cache_key(eventstorming_context)
+    cached = _get_cached_concepts(cache_key)
+    if cached is None and UML_CONCEPTS_CACHE_DIR:
+        cached = await asyncio.to_thread(_read_persisted_concepts, cache_key)
+        if cached is not None:
+            _cache_concepts(cache_key, cached)
+    if cached is not None:
+        logging.info("Using cached UMLConcepts for this context.")
+        return cached
+
+    context_data = eventstorming_context
+    prompt_inputs = {
+        "project_name": context_data.get('project_name'),
+        "context_name": context_data.get('context_name'),
+        "context_description": context_data.get('context_description'),
+        # Compact JSON: indentation only adds input tokens
+        "items": orjson.dumps(context_data.get('items', [])).decode(),
+    }
+    # Only transient failures (network, timeouts, rate limits, 5xx) are retried, with exponential backoff;
+    # schema-constrained output does not need repair retries, so anything else fails fast
+    try:
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(3),
+            wait=wait_exponential(multiplier=0.5),
+            retry=retry_if_exception_type(_TRANSIENT_LLM_ERRORS),
+            before_sleep=_log_retry,
+            reraise=True,
+        ):
+            with attempt:
+                concepts = await _ainvoke_concepts(prompt_inputs)
+    except Exception as e:
+        logging.error("Failed to generate valid UML concepts (%s): %s", type(e).__name__, e)
+        return None
+
+    logging.info("Successfully generated and validated UMLConcepts.")
+    # Cached objects are shared; the diagram builder only reads them
+    _cache_concepts(cache_key, concepts)
+    if UML_CONCEPTS_CACHE_DIR:
+        try:
+            await asyncio.to_thread(_persist_concepts, cache_key, concepts)
+        except OSError as e:
+            logging.warning("Could not persist UML concepts cache entry: %s", e)
+    return concepts
 
-def _slugify(text: str) -> str:
-    return ''.join(c if c.isalnum() else '-' for c in text).strip('-').lower() or 'uml-diagram'
 
+# One dash per non-alphanumeric character (Unicode-aware, so Korean names are kept)
+_SLUG_RE = re.compile(r'[\W_]')
+
+def _slugify(text: str) -> str:
+    return _SLUG_RE.sub('-', text).strip('-').lower() or 'uml-diagram'
+
+
+_ID_POOL_SIZE = 256
+_id_pool: list[str] = []
+
+def _new_id() -> str:
+    """Returns a UUID4 string, refilling the pool with a single os.urandom call when empty."""
+    if not _id_pool:
+        buf = os.urandom(16 * _ID_POOL_SIZE)
+        _id_pool.extend(str(uuid.UUID(bytes=buf[i:i + 16], version=4)) for i in range(0, len(buf), 16))
+    return _id_pool.pop()
+
+
+# Grid layout for generated classes (same positions as stepping x by 320 and wrapping past 1200)
+GRID_ORIGIN = 100
+GRID_STEP_X = 320
+GRID_STEP_Y = 260
+GRID_COLUMNS = 4
+# Fields shared by every class item on the board
+CLASS_ITEM_TEMPLATE = {"type": "Class", "width": 280, "height": 220}
+# Placeholder class when no classes could be inferred; tuples so every copy shares the same empty sequences
+_FALLBACK_ITEM = {
+    **CLASS_ITEM_TEMPLATE,
+    "instanceName": "FallbackAggregate",
+    "stereotype": "AggregateRoot",
+    "description": "Fallback: The UML generator could not infer specific classes.",
+    "x": GRID_ORIGIN,
+    "y": GRID_ORIGIN,
+    "attributes": (),
+    "methods": (),
+    "relationships": (),
+}
 
 def _create_uml_diagram(description: str, concepts: UMLConcepts | None = None, context_data: dict | None = None) -> dict:
     diagram_name = "generated-uml-diagram"
@@ -202,48 +372,49 @@ def _create_uml_diagram(description: str, concepts: UMLConcepts | None = None, c
     connections = []
     
     if concepts and concepts.classes:
-        # Simple grid layout
-        x_pos, y_pos = 100, 100
-        MAX_WIDTH = 1200
-        
+        # Simple grid layout: GRID_COLUMNS classes per row, position computed from the index
         name_to_id = {}
-
-        for i, uml_class in enumerate(concepts.classes, start=1):
-            item_id = str(uuid.uuid4())
+        # Bound methods hoisted out of the per-class and per-relationship loops
+        items_append = items.append
+        connections_append = connections.append
+        id_for_name = name_to_id.get
+
+        for i, uml_class in enumerate(concepts.classes):
+            row, col = divmod(i, GRID_COLUMNS)
+            # One dump per class instead of one per attribute and method
+            dumped = uml_class.model_dump(include={"attributes", "methods"})
+            item_id = _new_id()
             name_to_id[uml_class.name] = item_id
 
             uml_item = {
+                **CLASS_ITEM_TEMPLATE,
                 "id": item_id,
-                "type": "Class",
                 "instanceName": uml_class.name,
                 "stereotype": uml_class.stereotype,
                 "description": f"Class for {uml_class.name}.",
-                "x": x_pos,
-                "y": y_pos,
-                "width": 280,
-                "height": 220,
-                "attributes": [attr.dict() for attr in uml_class.attributes],
-                "methods": [meth.dict() for meth in uml_class.methods],
+                "x": GRID_ORIGIN + col * GRID_STEP_X,
+                "y": GRID_ORIGIN + row * GRID_STEP_Y,
+                "attributes": dumped["attributes"],
+                "methods": dumped["methods"],
             }
             
             if uml_class.enumValues:
                 uml_item["enumValues"] = uml_class.enumValues
 
-            items.append(uml_item)
-            
-            x_pos += 320
-            if x_pos > MAX_WIDTH:
-                x_pos = 100
-                y_pos += 260
+            items_append(uml_item)
         
-        # Generate connections from relationships
+        # Generate connections from relationships, recording connected class names for the orphan filter
+        connected_names = set()
+        add_connected = connected_names.add
         for rel in concepts.relationships:
-            source_id = name_to_id.get(rel.source)
-            target_id = name_to_id.get(rel.target)
+            source_id = id_for_name(rel.source)
+            target_id = id_for_name(rel.target)
             
             if source_id and target_id:
-                connections.append({
-                    "id": str(uuid.uuid4()),
+                add_connected(rel.source)
+                add_connected(rel.target)
+                connections_append({
+                    "id": _new_id(),
                     "from": source_id,
                     "to": target_id,
                     "type": rel.type,
@@ -254,43 +425,21 @@ def _create_uml_diagram(description: str, concepts: UMLConcepts | None = None, c
                 logging.warning(f"Could not create relationship {rel.source} -> {rel.target}. Class not found.")
 
         # --- Orphan Removal Logic ---
-        # Identify all IDs involved in connections
-        connected_ids = set()
-        for conn in connections:
-            connected_ids.add(conn["from"])
-            connected_ids.add(conn["to"])
-
-        # Filter out disconnected ValueObjects and Enums
+        # Keep connected classes and anything that is not a ValueObject or Enum
+        # (e.g. Aggregate, Command, Event should stay even if disconnected, though ideally they are connected).
+        # User specifically asked about "ENUM or VO", so we target those for removal.
         filtered_items = []
         for item in items:
-            # Keep if connected
-            if item["id"] in connected_ids:
-                filtered_items.append(item)
-            # Keep if NOT ValueObject or Enum (e.g. Aggregate, Command, Event should stay even if disconnected, though ideally they are connected)
-            # User specifically asked about "ENUM or VO", so we target those for removal.
-            elif item.get("stereotype") not in ["ValueObject", "Enum"]:
+            if item["instanceName"] in connected_names or item["stereotype"] not in ("ValueObject", "Enum"):
                 filtered_items.append(item)
             else:
-                logging.info(f"Removing disconnected orphan item: {item['instanceName']} ({item.get('stereotype')})")
+                logging.info(f"Removing disconnected orphan item: {item['instanceName']} ({item['stereotype']})")
         
         items = filtered_items
         # -----------------------------
 
     if not items:
-        items.append({
-            "id": str(uuid.uuid4()),
-            "type": "Class",
-            "instanceName": "FallbackAggregate",
-            "stereotype": "AggregateRoot",
-            "description": "Fallback: The UML generator could not infer specific classes.",
-            "x": 100,
-            "y": 100,
-            "width": 280,
-            "height": 220,
-            "attributes": [],
-            "methods": [],
-            "relationships": []
-        })
+        items.append({**_FALLBACK_ITEM, "id": _new_id()})
 
     return {
         "boardType": "UML",
@@ -300,31 +449,73 @@ def _create_uml_diagram(description: str, concepts: UMLConcepts | None = None, c
     }
 
 
+# Item types the UML prompt builds classes around (the eventstorming board may use either spelling)
+_MODELABLE_ITEM_TYPES = frozenset({"AGGREGATE", "COMMAND", "READMODEL", "READ_MODEL"})
+
+def _has_modelable_items(context_data: dict) -> bool:
+    return any(
+        isinstance(item, dict) and str(item.get("type", "")).upper() in _MODELABLE_ITEM_TYPES
+        for item in context_data.get("items") or ()
+    )
+
+
 class UmlAgent:
     """A smart agent that generates a domain-specific UML diagram from an Eventstorming context."""
 
     async def ainvoke(self, payload: str) -> str:
         """
         Generates a UML diagram from a JSON string payload containing eventstorming context.
+        A JSON list of contexts produces a JSON list of diagrams, generated concurrently.
         """
         description = f"Generated UML Diagram {datetime.utcnow().isoformat()}"
-        context_data: dict | None = None
+        context_data: dict | list | None = None
         
         try:
             # The entire payload is the context data from the orchestrator
-            context_data = json.loads(payload)
-        except (json.JSONDecodeError, TypeError) as e:
-            logging.error(f"Failed to parse payload as JSON: {e}. Payload: {payload[:500]}")
+            context_data = orjson.loads(payload)
+        except (orjson.JSONDecodeError, TypeError) as e:
+            logging.error("Failed to parse payload as JSON: %s. Payload: %.500s", e, payload)
             # If payload is not a valid JSON, we cannot proceed with concept generation.
             board = _create_uml_diagram(description, None, None)
-            return json.dumps(board, ensure_ascii=False)
+            return orjson.dumps(board).decode()
+
+        if isinstance(context_data, list):
+            return "[" + ",".join(await self.ainvoke_many(context_data)) + "]"
+
+        board = await self._generate_board(context_data, description)
+        return orjson.dumps(board).decode()
+
+    async def ainvoke_many(self, contexts: list[dict]) -> list[str]:
+        """
+        Generates one UML diagram per eventstorming context, running at most UML_LLM_CONCURRENCY LLM calls at once.
+        Results keep the order of `contexts`; a context that fails gets the fallback diagram.
+        """
+        description = f"Generated UML Diagram {datetime.utcnow().isoformat()}"
+        semaphore = asyncio.Semaphore(UML_LLM_CONCURRENCY)
+
+        async def _generate(context_data: dict) -> dict:
+            async with semaphore:
+                return await self._generate_board(context_data, description)
+
+        boards = await asyncio.gather(*(_generate(c) for c in contexts), return_exceptions=True)
+        results = []
+        for context_data, board in zip(contexts, boards):
+            if isinstance(board, Exception):
+                logging.error("UML generation failed for a context: %s", board)
+                board = _create_uml_diagram(description, None, context_data if isinstance(context_data, dict) else None)
+            results.append(orjson.dumps(board).decode())
+        return results
+
+    async def _generate_board(self, context_data: dict, description: str) -> dict:
+        if not _has_modelable_items(context_data):
+            # Nothing to derive classes from; skip the LLM call and return the fallback diagram
+            logging.info("Context '%s' has no aggregates, commands or read models; skipping UML generation.", context_data.get('context_name'))
+            return _create_uml_diagram(description, None, context_data)
 
         # Generate detailed UML concepts from the parsed context
         concepts = await _generate_uml_concepts(context_data)
         
         # Create the final diagram using the concepts and context data
-        board = _create_uml_diagram(description, concepts, context_data)
-
-        return json.dumps(board, ensure_ascii=False)
+        return _create_uml_diagram(description, concepts, context_data)
 
     SUPPORTED_CONTENT_TYPES = ['text', 'text/plain']
\ No newline at end of file